@@ -1,17 +1,28 @@
+import asyncio
+import hashlib
+import os
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 import mediapipe as mp
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from typing import Optional
 import time
+from math import sqrt
+from numba import njit
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Silhouette Image Analyzer",
     description="Backend for analyzing full-body photos and calculating measurements",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for local development
@@ -24,70 +35,262 @@ app.add_middleware(
 )
 
 # Standard MediaPipe initialization
-print("Initializing MediaPipe Pose model...")
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=True,
-    model_complexity=2,
-    smooth_landmarks=False,
-    enable_segmentation=False,
-    min_detection_confidence=0.5
-)
-print("MediaPipe Pose model initialized successfully!")
 
+# Decoding and pose inference run here so they don't block the event loop
+POSE_POOL_SIZE = os.cpu_count() or 1
+EXECUTOR = ThreadPoolExecutor(max_workers=POSE_POOL_SIZE)
+
+# Longest image side fed to pose inference; landmark accuracy plateaus well below phone resolutions
+MAX_INFERENCE_DIM = 1280
+
+# OpenCV >= 4.10 decodes straight to RGB; older builds swap channels in place after the resize
+IMREAD_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+DECODE_FLAG = IMREAD_RGB if IMREAD_RGB is not None else cv2.IMREAD_COLOR
+
+# Leading magic bytes of supported image formats
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png"
+}
+
+# Uploads larger than this are rejected before decoding
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+# Recent /measure responses keyed by (image digest, height, high_accuracy), least recently used first
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE = OrderedDict()
+
+# A Pose instance is not thread-safe, so each inference borrows one from a pool.
+# model_complexity=1 is the default; high-accuracy requests use the complexity-2 pool.
+POSE_POOL = queue.Queue()
+POSE_POOL_HQ = queue.Queue()
+
+
+def create_pose(model_complexity: int):
+    """Create a MediaPipe Pose model configured for single photos"""
+    return mp_pose.Pose(
+        static_image_mode=True,
+        model_complexity=model_complexity,
+        smooth_landmarks=False,
+        enable_segmentation=False,
+        min_detection_confidence=0.5
+    )
 
-# Helper Functions
-def calculate_distance_3d(landmark1, landmark2) -> float:
-    """Calculate 3D Euclidean distance between two landmarks"""
-    p1 = np.array([landmark1.x, landmark1.y, landmark1.z])
-    p2 = np.array([landmark2.x, landmark2.y, landmark2.z])
-    return np.linalg.norm(p2 - p1)
 
+@app.on_event("startup")
+def load_pose_pool():
+    """Preload one Pose model of each complexity per executor thread"""
+    print(f"Initializing {POSE_POOL_SIZE} MediaPipe Pose model(s) per complexity...")
+    for _ in range(POSE_POOL_SIZE):
+        POSE_POOL.put(create_pose(model_complexity=1))
+        POSE_POOL_HQ.put(create_pose(model_complexity=2))
+    print("MediaPipe Pose models initialized successfully!")
 
-def calculate_midpoint(landmark1, landmark2):
-    """Calculate midpoint between two landmarks"""
-    p1 = np.array([landmark1.x, landmark1.y, landmark1.z])
-    p2 = np.array([landmark2.x, landmark2.y, landmark2.z])
-    return (p1 + p2) / 2
 
+def run_pose(image_rgb: np.ndarray, pool: queue.Queue):
+    """Run pose detection using a Pose instance borrowed from the given pool"""
+    pose = pool.get()
+    try:
+        return pose.process(image_rgb)
+    finally:
+        pool.put(pose)
+
+
+def decode_and_validate(contents: bytes) -> Optional[np.ndarray]:
+    """Check an upload's magic bytes and decode it, returning None if decoding fails"""
+    if not contents.startswith(tuple(IMAGE_SIGNATURES)):
+        raise ValueError("Unsupported image format")
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), DECODE_FLAG)
+
+
+def prepare_image(image: np.ndarray) -> np.ndarray:
+    """Downscale a decoded image for inference and make sure it is RGB"""
+    image_height, image_width = image.shape[:2]
+    scale = MAX_INFERENCE_DIM / max(image_height, image_width)
+    if scale < 1.0:
+        image = cv2.resize(
+            image,
+            (int(image_width * scale), int(image_height * scale)),
+            interpolation=cv2.INTER_AREA
+        )
+    if IMREAD_RGB is None:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image
+
+
+# MediaPipe pose landmark indices used by the measurements
+NOSE = 0
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+LEFT_HEEL = 29
+RIGHT_HEEL = 30
+
+# Minimum landmark visibility for a landmark to be used in a measurement
+VISIBILITY_THRESHOLD = 0.5
+
+# Unit conversion constants
+_CM_TO_HALF_INCH = 2.0 / 2.54
+_HALF = 0.5
+_TWO_INCH_EASE_CM = 2.0 * 2.54
+_FOUR_INCH_EASE_CM = 4.0 * 2.54
+
+# Calibration factor bands for high (detected/actual height within 0.8-1.2)
+# and medium (within 0.6-1.4) calibration confidence
+_CONF_LO_HIGH, _CONF_HI_HIGH = 1 / 1.2, 1 / 0.8
+_CONF_LO_MED, _CONF_HI_MED = 1 / 1.4, 1 / 0.6
+
+# Wire layout of a serialized Landmark with all five fields set: a length-delimited
+# record header (field 1, 25 bytes) followed by tagged 32-bit floats for
+# x, y, z, visibility and presence
+_LANDMARK_RECORD_BYTES = 27
+_LANDMARK_TAG_OFFSETS = np.array([0, 1, 2, 7, 12, 17, 22])
+_LANDMARK_TAGS = np.array([0x0a, 25, 0x0d, 0x15, 0x1d, 0x25, 0x2d], dtype=np.uint8)
 
-def is_landmark_visible(landmark, threshold=0.5) -> bool:
-    """Check if landmark has sufficient visibility confidence"""
-    return hasattr(landmark, 'visibility') and landmark.visibility >= threshold
 
+# Helper Functions
+def landmarks_to_array(landmarks) -> np.ndarray:
+    """Pack landmarks into a (33, 4) float32 array of x, y, z, visibility"""
+    L = np.empty((len(landmarks), 4), dtype=np.float32)
+    for i, lm in enumerate(landmarks):
+        L[i] = (lm.x, lm.y, lm.z, lm.visibility)
+    return L
+
+
+def world_landmarks_to_array(world_landmarks) -> np.ndarray:
+    """Pack a LandmarkList into a (33, 4) array by parsing its serialized bytes
+
+    Falls back to reading landmark attributes when the message doesn't have
+    the fixed wire layout (e.g. an unset field).
+    """
+    landmarks = world_landmarks.landmark
+    count = len(landmarks)
+    buf = world_landmarks.SerializeToString()
+
+    if len(buf) == count * _LANDMARK_RECORD_BYTES:
+        records = np.frombuffer(buf, dtype=np.uint8).reshape(count, _LANDMARK_RECORD_BYTES)
+        if (records[:, _LANDMARK_TAG_OFFSETS] == _LANDMARK_TAGS).all():
+            fields = records[:, 2:].reshape(count, 5, 5)[:, :4, 1:]
+            return np.ascontiguousarray(fields).view("<f4").reshape(count, 4)
+
+    return landmarks_to_array(landmarks)
+
+
+@njit("float32(float32, float32, float32, float32, float32, float32)", cache=True, fastmath=True)
+def _distance_3d(x1, y1, z1, x2, y2, z2):
+    """Calculate 3D Euclidean distance between two points"""
+    dx = x1 - x2
+    dy = y1 - y2
+    dz = z1 - z2
+    return sqrt(dx * dx + dy * dy + dz * dz)
+
+
+# Kernel results are single precision like the landmarks; final rounding hides the difference
+@njit(
+    "Tuple((boolean, float32, float32, boolean, float32, float32, int64, float32, float32, int64, float32, boolean))"
+    "(float32[:, :], float32)",
+    cache=True,
+    fastmath=True
+)
+def _measure_core(L, calibration_factor):
+    """Calculate raw body measurements in cm from a packed (33, 4) landmark array
+
+    Returns visibility flags and averages, arm/leg counts and the shoulder,
+    hip, arm, torso and inseam lengths. Lengths are 0.0 when their landmarks
+    are not visible.
+    """
+    half = np.float32(0.5)
+    scale = np.float32(100.0) * calibration_factor
+
+    left_shoulder = L[LEFT_SHOULDER]
+    right_shoulder = L[RIGHT_SHOULDER]
+    left_hip = L[LEFT_HIP]
+    right_hip = L[RIGHT_HIP]
+
+    visible = L[:, 3] >= VISIBILITY_THRESHOLD
+    shoulders_visible = visible[LEFT_SHOULDER] and visible[RIGHT_SHOULDER]
+    hips_visible = visible[LEFT_HIP] and visible[RIGHT_HIP]
+    ankles_visible = visible[LEFT_ANKLE] and visible[RIGHT_ANKLE]
+
+    shoulder_x = half * (left_shoulder[0] + right_shoulder[0])
+    shoulder_y = half * (left_shoulder[1] + right_shoulder[1])
+    shoulder_z = half * (left_shoulder[2] + right_shoulder[2])
+    hip_x = half * (left_hip[0] + right_hip[0])
+    hip_y = half * (left_hip[1] + right_hip[1])
+    hip_z = half * (left_hip[2] + right_hip[2])
+
+    shoulder_cm = np.float32(0.0)
+    if shoulders_visible:
+        shoulder_cm = _distance_3d(
+            left_shoulder[0], left_shoulder[1], left_shoulder[2],
+            right_shoulder[0], right_shoulder[1], right_shoulder[2]
+        ) * scale
+    shoulder_visibility = half * (left_shoulder[3] + right_shoulder[3])
+
+    hip_cm = np.float32(0.0)
+    if hips_visible:
+        hip_cm = _distance_3d(
+            left_hip[0], left_hip[1], left_hip[2],
+            right_hip[0], right_hip[1], right_hip[2]
+        ) * scale
+    hip_visibility = half * (left_hip[3] + right_hip[3])
 
-def cm_to_inches(cm: float) -> float:
-    """Convert centimeters to inches"""
-    return cm / 2.54
+    arms_measured = 0
+    arm_total = np.float32(0.0)
+    for i in (LEFT_WRIST, RIGHT_WRIST):
+        if visible[i]:
+            arm_total += _distance_3d(shoulder_x, shoulder_y, shoulder_z, L[i, 0], L[i, 1], L[i, 2])
+            arms_measured += 1
+    arm_cm = arm_total / np.float32(arms_measured) * scale if arms_measured else np.float32(0.0)
 
+    torso_cm = np.float32(0.0)
+    if shoulders_visible and hips_visible:
+        torso_cm = _distance_3d(shoulder_x, shoulder_y, shoulder_z, hip_x, hip_y, hip_z) * scale
 
-def inches_to_cm(inches: float) -> float:
-    """Convert inches to centimeters"""
-    return inches * 2.54
+    legs_measured = 0
+    leg_total = np.float32(0.0)
+    for i in (LEFT_ANKLE, RIGHT_ANKLE):
+        if visible[i]:
+            leg_total += _distance_3d(hip_x, hip_y, hip_z, L[i, 0], L[i, 1], L[i, 2])
+            legs_measured += 1
+    inseam_cm = leg_total / np.float32(legs_measured) * scale if legs_measured else np.float32(0.0)
+
+    return (
+        shoulders_visible, shoulder_cm, shoulder_visibility,
+        hips_visible, hip_cm, hip_visibility,
+        arms_measured, arm_cm,
+        torso_cm,
+        legs_measured, inseam_cm,
+        ankles_visible
+    )
 
 
-def round_to_half_inch(inches: float) -> float:
-    """Round to nearest 0.5 inch"""
-    return round(inches * 2) / 2
+def cm_to_half_inch(cm: float) -> float:
+    """Convert centimeters to inches rounded to the nearest 0.5 inch"""
+    return round(cm * _CM_TO_HALF_INCH) * _HALF
 
 
-def calculate_calibration_factor(landmarks, actual_height_cm: float) -> dict:
+def calculate_calibration_factor(L: np.ndarray, actual_height_cm: float) -> dict:
     """Calculate scaling factor to convert world coordinates to real measurements"""
-    nose = landmarks[0]
-    left_heel = landmarks[29]
-    right_heel = landmarks[30]
+    nose_y = float(L[NOSE, 1])
+    heel_y = float(min(L[LEFT_HEEL, 1], L[RIGHT_HEEL, 1]))
 
-    heel = left_heel if left_heel.y < right_heel.y else right_heel
-    nose_to_heel_m = abs(heel.y - nose.y)
+    nose_to_heel_m = abs(heel_y - nose_y)
     detected_height_m = nose_to_heel_m * 1.15
 
     actual_height_m = actual_height_cm / 100
     calibration_factor = actual_height_m / detected_height_m
 
-    height_ratio = detected_height_m / actual_height_m
-    if 0.8 <= height_ratio <= 1.2:
+    if _CONF_LO_HIGH <= calibration_factor <= _CONF_HI_HIGH:
         confidence = 0.95
-    elif 0.6 <= height_ratio <= 1.4:
+    elif _CONF_LO_MED <= calibration_factor <= _CONF_HI_MED:
         confidence = 0.80
     else:
         confidence = 0.60
@@ -101,168 +304,77 @@ def calculate_calibration_factor(landmarks, actual_height_cm: float) -> dict:
 
 
 # Body Measurement Functions
-def calculate_shoulder_width(landmarks, calibration_factor: float) -> dict:
+def calculate_shoulder_width(visible: bool, distance_cm: float, visibility_avg: float) -> dict:
     """Calculate shoulder width"""
-    left_shoulder = landmarks[11]
-    right_shoulder = landmarks[12]
-
-    if not (is_landmark_visible(left_shoulder) and is_landmark_visible(right_shoulder)):
+    if not visible:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Shoulders not visible"}
 
-    distance_m = calculate_distance_3d(left_shoulder, right_shoulder)
-    distance_cm = distance_m * 100 * calibration_factor
-
-    visibility_avg = (left_shoulder.visibility + right_shoulder.visibility) / 2
     confidence = min(0.98, visibility_avg)
 
     return {"value": round(distance_cm, 1), "unit": "cm", "confidence": round(confidence, 2)}
 
 
-def calculate_chest_circumference(landmarks, calibration_factor: float, shoulder_width_cm: Optional[float] = None) -> dict:
+def calculate_chest_circumference(shoulder_width_cm: Optional[float]) -> dict:
     """Calculate chest circumference using shoulder width and anthropometric ratios"""
     if shoulder_width_cm is None:
-        shoulder_result = calculate_shoulder_width(landmarks, calibration_factor)
-        if shoulder_result["value"] is None:
-            return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Cannot calculate without shoulder reference"}
-        shoulder_width_cm = shoulder_result["value"]
+        return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Cannot calculate without shoulder reference"}
 
     chest_circumference_cm = shoulder_width_cm * 2.2
     return {"value": round(chest_circumference_cm, 1), "unit": "cm", "confidence": 0.75, "notes": "Estimated from shoulder width"}
 
 
-def calculate_hip_width(landmarks, calibration_factor: float) -> dict:
+def calculate_hip_width(visible: bool, distance_cm: float, visibility_avg: float) -> dict:
     """Calculate hip width"""
-    left_hip = landmarks[23]
-    right_hip = landmarks[24]
-
-    if not (is_landmark_visible(left_hip) and is_landmark_visible(right_hip)):
+    if not visible:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Hips not visible"}
 
-    distance_m = calculate_distance_3d(left_hip, right_hip)
-    distance_cm = distance_m * 100 * calibration_factor
-
-    visibility_avg = (left_hip.visibility + right_hip.visibility) / 2
     confidence = min(0.92, visibility_avg)
 
     return {"value": round(distance_cm, 1), "unit": "cm", "confidence": round(confidence, 2)}
 
 
-def calculate_waist_circumference(landmarks, calibration_factor: float, hip_width_cm: Optional[float] = None) -> dict:
+def calculate_waist_circumference(hip_width_cm: Optional[float]) -> dict:
     """Calculate waist circumference"""
     if hip_width_cm is None:
-        hip_result = calculate_hip_width(landmarks, calibration_factor)
-        if hip_result["value"] is None:
-            return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Cannot calculate without hip reference"}
-        hip_width_cm = hip_result["value"]
+        return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Cannot calculate without hip reference"}
 
     waist_circumference_cm = hip_width_cm * 2.0 * 0.90
     return {"value": round(waist_circumference_cm, 1), "unit": "cm", "confidence": 0.70, "notes": "Estimated from hip width"}
 
 
-def calculate_arm_length(landmarks, calibration_factor: float) -> dict:
+def calculate_arm_length(arms_measured: int, avg_length_cm: float) -> dict:
     """Calculate arm length from shoulder to wrist"""
-    left_shoulder = landmarks[11]
-    right_shoulder = landmarks[12]
-    left_wrist = landmarks[15]
-    right_wrist = landmarks[16]
-
-    shoulder_center = calculate_midpoint(left_shoulder, right_shoulder)
-
-    class Point:
-        def __init__(self, coords):
-            self.x, self.y, self.z = coords
-
-    shoulder_point = Point(shoulder_center)
-    arms_measured = 0
-    total_length = 0
-
-    if is_landmark_visible(left_wrist):
-        total_length += calculate_distance_3d(shoulder_point, left_wrist)
-        arms_measured += 1
-
-    if is_landmark_visible(right_wrist):
-        total_length += calculate_distance_3d(shoulder_point, right_wrist)
-        arms_measured += 1
-
     if arms_measured == 0:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Arms not visible"}
 
-    avg_length_m = total_length / arms_measured
-    avg_length_cm = avg_length_m * 100 * calibration_factor
-
     confidence = 0.93 if arms_measured == 2 else 0.80
     return {"value": round(avg_length_cm, 1), "unit": "cm", "confidence": confidence, "notes": f"Average of {arms_measured} arm(s)"}
 
 
-def calculate_torso_length(landmarks, calibration_factor: float) -> dict:
+def calculate_torso_length(visible: bool, torso_length_cm: float) -> dict:
     """Calculate torso length from shoulder to hip"""
-    left_shoulder = landmarks[11]
-    right_shoulder = landmarks[12]
-    left_hip = landmarks[23]
-    right_hip = landmarks[24]
-
-    shoulders_visible = is_landmark_visible(left_shoulder) and is_landmark_visible(right_shoulder)
-    hips_visible = is_landmark_visible(left_hip) and is_landmark_visible(right_hip)
-
-    if not (shoulders_visible and hips_visible):
+    if not visible:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Shoulders or hips not visible"}
 
-    shoulder_center = calculate_midpoint(left_shoulder, right_shoulder)
-    hip_center = calculate_midpoint(left_hip, right_hip)
-
-    torso_length_m = np.linalg.norm(hip_center - shoulder_center)
-    torso_length_cm = torso_length_m * 100 * calibration_factor
-
     return {"value": round(torso_length_cm, 1), "unit": "cm", "confidence": 0.90}
 
 
-def calculate_inseam_length(landmarks, calibration_factor: float) -> dict:
+def calculate_inseam_length(legs_measured: int, avg_length_cm: float) -> dict:
     """Calculate inseam length from hip to ankle"""
-    left_hip = landmarks[23]
-    right_hip = landmarks[24]
-    left_ankle = landmarks[27]
-    right_ankle = landmarks[28]
-
-    hip_center = calculate_midpoint(left_hip, right_hip)
-
-    class Point:
-        def __init__(self, coords):
-            self.x, self.y, self.z = coords
-
-    hip_point = Point(hip_center)
-    legs_measured = 0
-    total_length = 0
-
-    if is_landmark_visible(left_ankle):
-        total_length += calculate_distance_3d(hip_point, left_ankle)
-        legs_measured += 1
-
-    if is_landmark_visible(right_ankle):
-        total_length += calculate_distance_3d(hip_point, right_ankle)
-        legs_measured += 1
-
     if legs_measured == 0:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Ankles not visible"}
 
-    avg_length_m = total_length / legs_measured
-    avg_length_cm = avg_length_m * 100 * calibration_factor
-
     confidence = 0.88 if legs_measured == 2 else 0.75
     return {"value": round(avg_length_cm, 1), "unit": "cm", "confidence": confidence, "notes": f"Average of {legs_measured} leg(s)"}
 
 
-def calculate_leg_opening(landmarks, calibration_factor: float) -> dict:
+def calculate_leg_opening(ankles_visible: bool, hip_width_cm: Optional[float]) -> dict:
     """Calculate leg opening diameter at ankle"""
-    left_ankle = landmarks[27]
-    right_ankle = landmarks[28]
-
-    if not (is_landmark_visible(left_ankle) and is_landmark_visible(right_ankle)):
+    if not ankles_visible:
         return {"value": None, "unit": "cm", "confidence": 0.0, "error": "Ankles not visible"}
 
-    hip_result = calculate_hip_width(landmarks, calibration_factor)
-
-    if hip_result["value"]:
-        leg_opening_cm = hip_result["value"] * 0.47
+    if hip_width_cm:
+        leg_opening_cm = hip_width_cm * 0.47
         confidence = 0.75
     else:
         leg_opening_cm = 18.0
@@ -272,219 +384,107 @@ def calculate_leg_opening(landmarks, calibration_factor: float) -> dict:
 
 
 # Garment Measurement Functions
-def calculate_shirt_measurements(body_measurements: dict) -> dict:
-    """Calculate recommended shirt measurements from body measurements"""
-    shirt = {}
-
-    if body_measurements["shoulder_width"]["value"]:
-        shoulder_cm = body_measurements["shoulder_width"]["value"]
-        shoulder_inches = cm_to_inches(shoulder_cm)
-        shirt["shoulder"] = {
-            "value": round_to_half_inch(shoulder_inches),
-            "unit": "inches",
-            "confidence": body_measurements["shoulder_width"]["confidence"],
-            "notes": "Direct body measurement"
-        }
-    else:
-        shirt["shoulder"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["chest_circumference"]["value"]:
-        chest_cm = body_measurements["chest_circumference"]["value"]
-        chest_ease_cm = inches_to_cm(2.0)
-        chest_with_ease_cm = chest_cm + chest_ease_cm
-        chest_inches = cm_to_inches(chest_with_ease_cm)
-        shirt["chest"] = {
-            "value": round_to_half_inch(chest_inches),
-            "unit": "inches",
-            "confidence": body_measurements["chest_circumference"]["confidence"],
-            "notes": "Includes 2-inch ease for regular fit"
-        }
-    else:
-        shirt["chest"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["arm_length"]["value"]:
-        arm_cm = body_measurements["arm_length"]["value"]
-        shoulder_cm = body_measurements["shoulder_width"]["value"] or 45.0
-        sleeve_cm = arm_cm + (shoulder_cm / 2)
-        sleeve_inches = cm_to_inches(sleeve_cm)
-        shirt["sleeves"] = {
-            "value": round_to_half_inch(sleeve_inches),
-            "unit": "inches",
-            "confidence": body_measurements["arm_length"]["confidence"],
-            "notes": "Measured from center back to wrist"
-        }
-    else:
-        shirt["sleeves"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["torso_length"]["value"]:
-        torso_cm = body_measurements["torso_length"]["value"]
-        length_cm = torso_cm + 15.0
-        length_inches = cm_to_inches(length_cm)
-        shirt["length"] = {
-            "value": round_to_half_inch(length_inches),
-            "unit": "inches",
-            "confidence": body_measurements["torso_length"]["confidence"],
-            "notes": "Measured from high point shoulder to hem"
-        }
-    else:
-        shirt["length"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    return shirt
+_SHIRT_LENGTH_EXTRA_CM = 15.0
+_JACKET_LENGTH_EXTRA_CM = 18.0
+_JACKET_SHOULDER_EXTRA_CM = 1.0
+_JACKET_SLEEVE_EXTRA_CM = 2.5
+_PANTS_RISE_RATIO = 0.28
+_DEFAULT_SHOULDER_CM = 45.0
+
+# (garment, field, body measurement, transform(value_cm, shoulder_cm) -> cm, notes, confidence override)
+GARMENT_RULES = (
+    ("shirt", "shoulder", "shoulder_width", lambda v, _: v, "Direct body measurement", None),
+    ("shirt", "chest", "chest_circumference", lambda v, _: v + _TWO_INCH_EASE_CM, "Includes 2-inch ease for regular fit", None),
+    ("shirt", "sleeves", "arm_length", lambda v, s: v + s / 2, "Measured from center back to wrist", None),
+    ("shirt", "length", "torso_length", lambda v, _: v + _SHIRT_LENGTH_EXTRA_CM, "Measured from high point shoulder to hem", None),
+    ("pants", "waist", "waist_circumference", lambda v, _: v, "Natural waist measurement", None),
+    ("pants", "inseam", "inseam_length", lambda v, _: v, "Crotch to ankle measurement", None),
+    ("pants", "rise", "torso_length", lambda v, _: v * _PANTS_RISE_RATIO, "Estimated from torso proportions", 0.70),
+    ("pants", "leg", "leg_opening", lambda v, _: v, "Leg opening diameter", None),
+    ("jacket", "shoulder", "shoulder_width", lambda v, _: v + _JACKET_SHOULDER_EXTRA_CM, "Slightly wider than shirt for layering", None),
+    ("jacket", "chest", "chest_circumference", lambda v, _: v + _FOUR_INCH_EASE_CM, "Includes 4-inch ease for jacket fit", None),
+    ("jacket", "sleeves", "arm_length", lambda v, s: v + s / 2 + _JACKET_SLEEVE_EXTRA_CM, "Slightly longer than shirt sleeve", None),
+    ("jacket", "length", "torso_length", lambda v, _: v + _JACKET_LENGTH_EXTRA_CM, "Standard jacket length", None),
+)
 
 
-def calculate_pants_measurements(body_measurements: dict) -> dict:
-    """Calculate recommended pants measurements from body measurements"""
-    pants = {}
-
-    if body_measurements["waist_circumference"]["value"]:
-        waist_cm = body_measurements["waist_circumference"]["value"]
-        waist_inches = cm_to_inches(waist_cm)
-        pants["waist"] = {
-            "value": round_to_half_inch(waist_inches),
-            "unit": "inches",
-            "confidence": body_measurements["waist_circumference"]["confidence"],
-            "notes": "Natural waist measurement"
-        }
-    else:
-        pants["waist"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["inseam_length"]["value"]:
-        inseam_cm = body_measurements["inseam_length"]["value"]
-        inseam_inches = cm_to_inches(inseam_cm)
-        pants["inseam"] = {
-            "value": round_to_half_inch(inseam_inches),
-            "unit": "inches",
-            "confidence": body_measurements["inseam_length"]["confidence"],
-            "notes": "Crotch to ankle measurement"
-        }
-    else:
-        pants["inseam"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["torso_length"]["value"]:
-        torso_cm = body_measurements["torso_length"]["value"]
-        rise_cm = torso_cm * 0.28
-        rise_inches = cm_to_inches(rise_cm)
-        pants["rise"] = {
-            "value": round_to_half_inch(rise_inches),
-            "unit": "inches",
-            "confidence": 0.70,
-            "notes": "Estimated from torso proportions"
-        }
-    else:
-        pants["rise"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["leg_opening"]["value"]:
-        leg_cm = body_measurements["leg_opening"]["value"]
-        leg_inches = cm_to_inches(leg_cm)
-        pants["leg"] = {
-            "value": round_to_half_inch(leg_inches),
-            "unit": "inches",
-            "confidence": body_measurements["leg_opening"]["confidence"],
-            "notes": "Leg opening diameter"
-        }
-    else:
-        pants["leg"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    return pants
+def calculate_garment_measurements(body_measurements: dict) -> dict:
+    """Calculate recommended shirt, pants and jacket measurements from body measurements"""
+    garments = {"shirt": {}, "pants": {}, "jacket": {}}
+    shoulder_cm = body_measurements["shoulder_width"]["value"] or _DEFAULT_SHOULDER_CM
 
+    for garment, field, source, transform, notes, confidence in GARMENT_RULES:
+        body = body_measurements[source]
+        if body["value"]:
+            garments[garment][field] = {
+                "value": cm_to_half_inch(transform(body["value"], shoulder_cm)),
+                "unit": "inches",
+                "confidence": body["confidence"] if confidence is None else confidence,
+                "notes": notes
+            }
+        else:
+            garments[garment][field] = {"value": None, "unit": "inches", "confidence": 0.0}
+
+    return garments
+
+
+# Body measurement keys, in response order
+_MEASURE_KEYS = (
+    "shoulder_width",
+    "chest_circumference",
+    "waist_circumference",
+    "hip_width",
+    "arm_length",
+    "torso_length",
+    "inseam_length",
+    "leg_opening"
+)
+_MISSING_WARNING = "Missing measurements: {}"
+_RETRY_WARNING = "Please upload another photo for best results"
 
-def calculate_jacket_measurements(body_measurements: dict) -> dict:
-    """Calculate recommended jacket measurements from body measurements"""
-    jacket = {}
 
-    if body_measurements["shoulder_width"]["value"]:
-        shoulder_cm = body_measurements["shoulder_width"]["value"] + 1.0
-        shoulder_inches = cm_to_inches(shoulder_cm)
-        jacket["shoulder"] = {
-            "value": round_to_half_inch(shoulder_inches),
-            "unit": "inches",
-            "confidence": body_measurements["shoulder_width"]["confidence"],
-            "notes": "Slightly wider than shirt for layering"
-        }
-    else:
-        jacket["shoulder"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["chest_circumference"]["value"]:
-        chest_cm = body_measurements["chest_circumference"]["value"]
-        chest_ease_cm = inches_to_cm(4.0)
-        chest_with_ease_cm = chest_cm + chest_ease_cm
-        chest_inches = cm_to_inches(chest_with_ease_cm)
-        jacket["chest"] = {
-            "value": round_to_half_inch(chest_inches),
-            "unit": "inches",
-            "confidence": body_measurements["chest_circumference"]["confidence"],
-            "notes": "Includes 4-inch ease for jacket fit"
-        }
-    else:
-        jacket["chest"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["arm_length"]["value"]:
-        arm_cm = body_measurements["arm_length"]["value"]
-        shoulder_cm = body_measurements["shoulder_width"]["value"] or 45.0
-        sleeve_cm = arm_cm + (shoulder_cm / 2) + 2.5
-        sleeve_inches = cm_to_inches(sleeve_cm)
-        jacket["sleeves"] = {
-            "value": round_to_half_inch(sleeve_inches),
-            "unit": "inches",
-            "confidence": body_measurements["arm_length"]["confidence"],
-            "notes": "Slightly longer than shirt sleeve"
-        }
-    else:
-        jacket["sleeves"] = {"value": None, "unit": "inches", "confidence": 0.0}
-
-    if body_measurements["torso_length"]["value"]:
-        torso_cm = body_measurements["torso_length"]["value"]
-        length_cm = torso_cm + 18.0
-        length_inches = cm_to_inches(length_cm)
-        jacket["length"] = {
-            "value": round_to_half_inch(length_inches),
-            "unit": "inches",
-            "confidence": body_measurements["torso_length"]["confidence"],
-            "notes": "Standard jacket length"
-        }
-    else:
-        jacket["length"] = {"value": None, "unit": "inches", "confidence": 0.0}
+def calculate_measurements(L: np.ndarray, height_cm: float, weight_kg: Optional[float] = None) -> dict:
+    """Master function to calculate all body and garment measurements"""
 
-    return jacket
+    calibration_result = calculate_calibration_factor(L, height_cm)
+    calibration_factor = calibration_result["calibration_factor"]
 
+    (
+        shoulders_visible, shoulder_cm, shoulder_visibility,
+        hips_visible, hip_cm, hip_visibility,
+        arms_measured, arm_cm,
+        torso_cm,
+        legs_measured, inseam_cm,
+        ankles_visible
+    ) = _measure_core(L, np.float32(calibration_factor))
 
-def calculate_measurements(landmarks, height_cm: float, weight_kg: Optional[float] = None) -> dict:
-    """Master function to calculate all body and garment measurements"""
-    calibration_result = calculate_calibration_factor(landmarks, height_cm)
-    calibration_factor = calibration_result["calibration_factor"]
+    shoulder = calculate_shoulder_width(shoulders_visible, shoulder_cm, shoulder_visibility)
+    hip = calculate_hip_width(hips_visible, hip_cm, hip_visibility)
 
     body_measurements = {
-        "shoulder_width": calculate_shoulder_width(landmarks, calibration_factor),
-        "chest_circumference": calculate_chest_circumference(landmarks, calibration_factor),
-        "waist_circumference": calculate_waist_circumference(landmarks, calibration_factor),
-        "hip_width": calculate_hip_width(landmarks, calibration_factor),
-        "arm_length": calculate_arm_length(landmarks, calibration_factor),
-        "torso_length": calculate_torso_length(landmarks, calibration_factor),
-        "inseam_length": calculate_inseam_length(landmarks, calibration_factor),
-        "leg_opening": calculate_leg_opening(landmarks, calibration_factor)
+        "shoulder_width": shoulder,
+        "chest_circumference": calculate_chest_circumference(shoulder["value"]),
+        "waist_circumference": calculate_waist_circumference(hip["value"]),
+        "hip_width": hip,
+        "arm_length": calculate_arm_length(arms_measured, arm_cm),
+        "torso_length": calculate_torso_length(shoulders_visible and hips_visible, torso_cm),
+        "inseam_length": calculate_inseam_length(legs_measured, inseam_cm),
+        "leg_opening": calculate_leg_opening(ankles_visible, hip["value"])
     }
 
-    garment_measurements = {
-        "shirt": calculate_shirt_measurements(body_measurements),
-        "pants": calculate_pants_measurements(body_measurements),
-        "jacket": calculate_jacket_measurements(body_measurements)
-    }
+    garment_measurements = calculate_garment_measurements(body_measurements)
 
-    available_count = sum(1 for m in body_measurements.values() if m["value"] is not None)
-    total_count = len(body_measurements)
+    missing = [key for key in _MEASURE_KEYS if body_measurements[key]["value"] is None]
+    available_count = len(_MEASURE_KEYS) - len(missing)
 
-    if available_count == total_count:
+    if not missing:
         status = "success"
         message = "Measurements calculated successfully"
         warnings = None
     elif available_count > 0:
         status = "partial_success"
         message = "Some body landmarks not detected. Partial measurements returned."
-        warnings = []
-        missing = [key for key, val in body_measurements.items() if val["value"] is None]
-        if missing:
-            warnings.append(f"Missing measurements: {', '.join(missing)}")
-            warnings.append("Please upload another photo for best results")
+        warnings = [_MISSING_WARNING.format(", ".join(missing)), _RETRY_WARNING]
     else:
         status = "error"
         message = "Could not calculate measurements"
@@ -504,6 +504,49 @@ def calculate_measurements(landmarks, height_cm: float, weight_kg: Optional[floa
     return result
 
 
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload in chunks, rejecting it as soon as it exceeds MAX_UPLOAD_BYTES"""
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail={
+                    "status": "error",
+                    "error_code": "FILE_TOO_LARGE",
+                    "message": f"File size exceeds maximum ({MAX_UPLOAD_BYTES // (1024 * 1024)}MB)",
+                    "details": {
+                        "max_size_bytes": MAX_UPLOAD_BYTES
+                    },
+                    "suggestions": [
+                        "Compress the image",
+                        "Reduce image quality/resolution",
+                        "Take a new photo with lower quality settings"
+                    ]
+                }
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def get_cached_response(key: tuple) -> Optional[dict]:
+    """Look up a cached /measure response and mark it as recently used"""
+    response = RESULT_CACHE.get(key)
+    if response is not None:
+        RESULT_CACHE.move_to_end(key)
+    return response
+
+
+def cache_response(key: tuple, response: dict):
+    """Store a /measure response, evicting the least recently used one when full"""
+    RESULT_CACHE[key] = response
+    RESULT_CACHE.move_to_end(key)
+    if len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+        RESULT_CACHE.popitem(last=False)
+
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -534,7 +577,8 @@ async def health_check():
 async def get_measurement(
     file: UploadFile = File(...),
     height_cm: float = Form(...),
-    weight_kg: Optional[float] = Form(None)
+    weight_kg: Optional[float] = Form(None),
+    high_accuracy: bool = Form(False)
 ):
     """Analyze full-body photo and return measurements"""
     start_time = time.time()
@@ -550,26 +594,33 @@ async def get_measurement(
             }
         )
 
-    # Validate file type
-    if file.content_type not in ["image/jpeg", "image/png"]:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "status": "error",
-                "error_code": "INVALID_FILE_FORMAT",
-                "message": "Invalid image format. Please upload JPEG or PNG.",
-                "details": {
-                    "received_format": file.content_type,
-                    "supported_formats": ["image/jpeg", "image/png"]
-                }
-            }
-        )
-
     try:
         # Read and decode image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        contents = await read_upload(file)
+
+        # Identical uploads skip decoding and inference entirely
+        cache_key = (hashlib.sha1(contents).digest(), height_cm, high_accuracy)
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            processing_time_ms = int((time.time() - start_time) * 1000)
+            return {**cached, "metadata": {**cached["metadata"], "processing_time_ms": processing_time_ms}}
+
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(EXECUTOR, decode_and_validate, contents)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "status": "error",
+                    "error_code": "INVALID_FILE_FORMAT",
+                    "message": "Invalid image format. Please upload JPEG or PNG.",
+                    "details": {
+                        "received_format": file.content_type,
+                        "supported_formats": list(IMAGE_SIGNATURES.values())
+                    }
+                }
+            )
 
         if image is None:
             raise HTTPException(
@@ -597,11 +648,12 @@ async def get_measurement(
                 }
             )
 
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # Downscale and convert to RGB
+        image_rgb = await loop.run_in_executor(EXECUTOR, prepare_image, image)
 
         # Run MediaPipe pose detection
-        results = pose.process(image_rgb)
+        pool = POSE_POOL_HQ if high_accuracy else POSE_POOL
+        results = await loop.run_in_executor(EXECUTOR, run_pose, image_rgb, pool)
 
         if not results.pose_world_landmarks:
             raise HTTPException(
@@ -620,12 +672,11 @@ async def get_measurement(
                 }
             )
 
-        landmarks = results.pose_world_landmarks.landmark
-        detected_count = len(landmarks)
+        L = world_landmarks_to_array(results.pose_world_landmarks)
 
         # Calculate measurements
         measurements_result = calculate_measurements(
-            landmarks=landmarks,
+            L=L,
             height_cm=height_cm,
             weight_kg=weight_kg
         )
@@ -641,7 +692,7 @@ async def get_measurement(
                 "processing_time_ms": processing_time_ms,
                 "image_width": image_width,
                 "image_height": image_height,
-                "detected_landmarks": detected_count,
+                "detected_landmarks": L.shape[0],
                 "model_version": "mediapipe_pose_v2",
                 "calibration_factor": measurements_result["calibration_factor"]
             }
@@ -650,6 +701,7 @@ async def get_measurement(
         if "warnings" in measurements_result:
             response["warnings"] = measurements_result["warnings"]
 
+        cache_response(cache_key, response)
         return response
 
     except HTTPException:
@@ -664,6 +716,8 @@ async def get_measurement(
                 "message": "An unexpected error occurred during processing"
             }
         )
+    finally:
+        await file.close()
 
 
 if __name__ == "__main__":